@@ -0,0 +1,75 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from yt_dlp import YoutubeDL
+
+TIKTOK_BACKEND = os.environ.get("TIKTOK_BACKEND", "api")  # "api": yt-dlp in-process; "cli": yt-dlp subprocess
+
+
+def download_tiktok_with_api(url: str) -> str:
+    """
+    Download TikTok video to a local temp file using yt-dlp.
+    Returns the path to the local temp file.
+    """
+    # Create a temporary directory
+    temp_dir = tempfile.mkdtemp()
+
+    ydl_opts = {
+        'format': 'best[ext=mp4]/best',  # prefer mp4, fallback to best available
+        'outtmpl': os.path.join(temp_dir, 'tiktok_video.%(ext)s'),  # fixed name, nothing to sanitize
+        'quiet': True,
+        'merge_output_format': 'mp4',    # merge fragments if needed
+        'noplaylist': True
+    }
+
+    try:
+        with YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=True)
+
+        if not info:
+            raise ValueError("Failed to download TikTok video: no info extracted.")
+
+        # yt-dlp records where each download finally landed, after any merge or remux
+        downloads = info.get('requested_downloads')
+        video_path = downloads[0].get('filepath') if downloads else ydl.prepare_filename(info)
+
+        if not video_path or not os.path.exists(video_path) or os.path.getsize(video_path) == 0:
+            raise ValueError("Failed to download TikTok video: file not found or empty.")
+
+        return video_path
+
+    except Exception as e:
+        # Clean up temp directory on error
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        raise ValueError(f"Failed to download TikTok video: {str(e)}")
+
+
+def download_tiktok_with_cli(url: str) -> str:
+    """
+    Download TikTok video to a local temp file by running the yt-dlp command line.
+    Keeps yt-dlp's extractors and their memory out of the server process.
+    Returns the path to the local temp file.
+    """
+    temp_dir = tempfile.mkdtemp()
+    result = subprocess.run(
+        [
+            "yt-dlp", "--no-playlist", "--format", "best[ext=mp4]/best", "--merge-output-format", "mp4",
+            "--output", os.path.join(temp_dir, "tiktok_video.%(ext)s"),
+            "--print", "after_move:filepath",  # implies --quiet; prints the final path
+            url,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    video_path = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ""
+    if result.returncode != 0 or not os.path.isfile(video_path) or os.path.getsize(video_path) == 0:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        reason = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "file not found or empty."
+        raise ValueError(f"Failed to download TikTok video: {reason}")
+    return video_path
+
+
+TIKTOK_DOWNLOADERS = {"api": download_tiktok_with_api, "cli": download_tiktok_with_cli}
+download_tiktok_to_tempfile = TIKTOK_DOWNLOADERS[TIKTOK_BACKEND]
@@ -1,182 +1,788 @@
+import asyncio
+import functools
+import io
+import json
 import tempfile
 import os
 import subprocess
 import re
+import shutil
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import cv2
+import numpy as np
+import xxhash
 from flask import Flask, request, jsonify
+from google.api_core.exceptions import RequestRangeNotSatisfiable
 from google.cloud import vision, storage
-from yt_dlp import YoutubeDL
+from google.cloud.vision_v1.services.image_annotator.transports import ImageAnnotatorGrpcAsyncIOTransport
+from downloaders import download_tiktok_to_tempfile
+
+try:
+    import av
+except ImportError:
+    av = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_GRAY, TJSAMP_GRAY
+    _turbojpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):  # package or libturbojpeg missing
+    _turbojpeg = None
 
 app = Flask(__name__)
 
 # --- CONFIG ---
-FRAME_INTERVAL = 30
+FRAME_INTERVAL = 10  # frames between checks for changed on-screen content
+MIN_OCR_INTERVAL = 30  # min frames between OCR'd frames, so moving footage costs no more RPCs than fixed sampling
+MAX_OCR_INTERVAL = 90  # max frames between OCR'd frames, even if nothing seems to change on screen
 BOTTOM_IGNORE_RATIO = 0.25
 TOP_IGNORE_RATIO = 0.15
 UNWANTED = ["tiktok", "tik tok", "original sound", "music"]
 MAX_VIDEO_SIZE = 512 * 1024 * 1024  # 512 MB
+GCS_READ_CHUNK = 4 * 1024 * 1024  # bytes per ranged read when streaming a GCS video; also the probe size
+GCS_IN_MEMORY_MAX = 64 * 1024 * 1024  # videos up to this size are fetched in one GET and decoded from memory
+GCS_SLICE_SIZE = 32 * 1024 * 1024  # ranged slice size when a large video is downloaded to a temp file
+GCS_DOWNLOAD_WORKERS = 8
+MAX_OCR_DIMENSION = 1024  # Vision downsamples larger images internally anyway
+IMAGE_FORMAT = "auto"  # "jpeg", "png", "webp", or "auto": JPEG, or lossless PNG where it comes out smaller
+JPEG_QUALITY = 70
+WEBP_QUALITY = 80
+PNG_TRY_MAX_BPP = 0.1  # "auto" only tries PNG on flat frames whose JPEG is under this many bytes/pixel
+ADAPTIVE_THRESHOLD = False  # binarise frames before encoding; can sharpen low-contrast overlays
+FINGERPRINT_SIZE = 128  # side of the grey thumbnail used to spot repeated frames
+REPEAT_FRAME_MAX_DIFF = 10  # max per-pixel thumbnail change for a frame to count as a repeat
+HWACCEL_CANDIDATES = ("cuda", "vaapi", "qsv")  # ffmpeg hardware decoders, in order of preference
+# "pyav" or "ffmpeg"; unset picks PyAV unless a hardware decoder is available.
+FRAME_BACKEND = os.environ.get("FRAME_BACKEND")
+CLEAN_TEXT_CACHE_SIZE = 64  # cleaned results kept per video, keyed by the raw annotation text
+VISION_BATCH_SIZE = 16  # max images per batch_annotate_images request
+OCR_WORKERS = 3  # Vision batches in flight per video; more tends to trip HTTP 429
+VISION_MAX_IN_FLIGHT = 8  # Vision batches in flight per process; size to the API QPS quota
+# Send one tiny request at startup so the first video skips connection setup; "0" turns it off.
+VISION_PREWARM = os.environ.get("VISION_PREWARM", "1") == "1"
+VISION_CHANNEL_OPTIONS = [
+    # Ping while RPCs are open so a dead connection is noticed in seconds rather than at the
+    # deadline. Idle pings are left off: Google frontends answer them with GOAWAY.
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.http2.max_pings_without_data", 0),
+]
 # ----------------
 
-vision_client = vision.ImageAnnotatorClient()
-storage_client = storage.Client()
+# One background event loop per process runs every OCR pipeline, so all requests
+# multiplex their Vision RPCs over the async client's single gRPC channel.
+_event_loop = asyncio.new_event_loop()
+threading.Thread(target=_event_loop.run_forever, name="ocr-event-loop", daemon=True).start()
 
 
-def is_unwanted(text: str) -> bool:
-    text_norm = text.lower().replace(" ", "")
-    if any(bad.replace(" ", "") in text_norm for bad in UNWANTED):
-        return True
-    if re.match(r"@[\w\d_]+", text_norm):
-        return True
-    return False
+def run_async(coro):
+    """Run a coroutine on the shared event loop and block until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop).result()
+
+
+def _create_vision_channel(*args, options=(), **kwargs):
+    return ImageAnnotatorGrpcAsyncIOTransport.create_channel(
+        *args, options=[*options, *VISION_CHANNEL_OPTIONS], **kwargs
+    )
+
 
+def _create_vision_transport(**kwargs):
+    return ImageAnnotatorGrpcAsyncIOTransport(channel=_create_vision_channel, **kwargs)
 
-def clean_text(response, frame_height):
-    words = []
-    for page in response.full_text_annotation.pages:
-        for block in page.blocks:
-            for para in block.paragraphs:
-                line_words = []
-                for word in para.words:
-                    word_text = "".join([s.text for s in word.symbols])
-                    ymin = min(v.y for v in word.bounding_box.vertices)
-                    if ymin < frame_height * TOP_IGNORE_RATIO:
-                        continue
-                    if ymin > frame_height * (1 - BOTTOM_IGNORE_RATIO):
-                        continue
-                    line_words.append(word_text)
-                if line_words:
-                    line_text = " ".join(line_words)
-                    if not is_unwanted(line_text):
-                        words.append(line_text)
 
+async def _create_vision_client():
+    return vision.ImageAnnotatorAsyncClient(transport=_create_vision_transport)
+
+
+vision_client = run_async(_create_vision_client())
+# Shared by every request on the event loop, so it caps the process as a whole.
+_vision_in_flight = asyncio.Semaphore(VISION_MAX_IN_FLIGHT)
+
+
+@functools.lru_cache(maxsize=1)
+def get_storage_client():
+    """Create the Storage client on first use, so instances that only serve URLs never build it."""
+    return storage.Client()
+
+
+TEXT_DETECTION = vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)
+
+
+async def _prewarm_vision():
+    """Bring up TLS, HTTP/2 and the auth token with a blank 16x16 image; failures are ignored."""
+    _, blank = cv2.imencode(".jpg", np.zeros((16, 16), np.uint8))
+    warm_request = vision.AnnotateImageRequest(
+        image=vision.Image(content=blank.tobytes()), features=[TEXT_DETECTION]
+    )
+    try:
+        await vision_client.batch_annotate_images(requests=[warm_request], timeout=5)
+    except Exception:
+        pass  # the first real request pays for the connection instead
+
+
+if VISION_PREWARM:
+    # Not awaited: the worker starts serving while the connection comes up on the loop.
+    asyncio.run_coroutine_threadsafe(_prewarm_vision(), _event_loop)
+
+_UNWANTED_NORM = tuple(bad.replace(" ", "") for bad in UNWANTED)
+# One automaton pass replaces a substring scan per pattern, but its call overhead
+# only pays off from about ten patterns.
+_UNWANTED_AUTOMATON = None
+if ahocorasick is not None and len(_UNWANTED_NORM) >= 10:
+    _UNWANTED_AUTOMATON = ahocorasick.Automaton()
+    for bad in _UNWANTED_NORM:
+        _UNWANTED_AUTOMATON.add_word(bad, bad)
+    _UNWANTED_AUTOMATON.make_automaton()
+_USERNAME_RE = re.compile(r"@\w+")
+
+
+def is_unwanted(text_norm: str) -> bool:
+    """Check a lowercased, space-stripped line against the unwanted patterns."""
+    if _UNWANTED_AUTOMATON is not None:
+        found = next(_UNWANTED_AUTOMATON.iter(text_norm), None) is not None
+    else:
+        found = any(bad in text_norm for bad in _UNWANTED_NORM)
+    return found or _USERNAME_RE.match(text_norm) is not None
+
+
+def clean_text(response):
+    # Walk the raw protobuf rather than the proto-plus wrappers, which build a new
+    # wrapper object on every attribute access in this nested loop.
+    annotation = vision.AnnotateImageResponse.pb(response).full_text_annotation
+    paragraphs = (
+        para
+        for page in annotation.pages
+        for block in page.blocks
+        for para in block.paragraphs
+    )
+
+    # Filter and deduplicate in one pass, tracking 64-bit digests of the normalised lines.
     seen = set()
-    deduped = []
-    for line in words:
+    lines = []
+    for para in paragraphs:
+        line = " ".join(["".join([s.text for s in word.symbols]) for word in para.words])
+        if not line:
+            continue
         norm = line.lower().replace(" ", "")
-        if norm not in seen:
-            seen.add(norm)
-            deduped.append(line)
+        if is_unwanted(norm):
+            continue
+        digest = xxhash.xxh3_64_intdigest(norm.encode())
+        if digest not in seen:
+            seen.add(digest)
+            lines.append(line)
 
-    return " ".join(deduped)
+    return " ".join(lines)
 
 
-def download_gcs_to_tempfile(gcs_uri: str) -> str:
-    """Download video from GCS to a local temp file with size check."""
+def get_gcs_blob(gcs_uri: str):
+    """Resolve a gs:// URI to a blob, without fetching its metadata."""
     bucket_name, blob_name = gcs_uri[5:].split("/", 1)
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
+    bucket = get_storage_client().bucket(bucket_name)
+    return bucket.blob(blob_name)
 
+
+def check_gcs_blob_size(blob):
+    """Fetch a blob's metadata and check its size against MAX_VIDEO_SIZE."""
     blob.reload()
     if blob.size is None:
         raise ValueError("Could not determine object size.")
     if blob.size > MAX_VIDEO_SIZE:
         raise ValueError(f"Video too large: {blob.size/1024/1024:.2f} MB (limit 512 MB)")
 
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
-    blob.download_to_filename(temp_file.name)
-    return temp_file.name
 
+class CappedReader(io.RawIOBase):
+    """Seekable reader over a GCS object whose leading bytes are already in memory.
 
-def download_tiktok_to_tempfile(url: str) -> str:
+    Reads past head go through blob_reader. The stream ends at MAX_VIDEO_SIZE and
+    sets exceeded, so the limit holds even if the object metadata was stale.
     """
-    Download TikTok video to a local temp file using yt-dlp.
-    Returns the path to the local temp file with sanitized filename.
+
+    def __init__(self, blob_reader, head: bytes, size: int = None):
+        self._blob_reader = blob_reader
+        self._head = memoryview(head)
+        self._size = size  # None until known; given when head is the whole object
+        self._pos = 0
+        self._blob_pos = 0
+        self.exceeded = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END:
+            if self._size is None:
+                self._size = self._blob_pos = self._blob_reader.seek(0, io.SEEK_END)
+            self._pos = self._size + offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = offset
+        return self._pos
+
+    def readinto(self, buf):
+        if self._size is not None and self._pos >= self._size:
+            return 0
+        if self._pos < len(self._head):
+            data = self._head[self._pos:self._pos + len(buf)]
+        else:
+            if self._blob_pos != self._pos:
+                self._blob_pos = self._blob_reader.seek(self._pos)
+            data = self._blob_reader.read(len(buf))
+            self._blob_pos += len(data)
+        if self._pos + len(data) > MAX_VIDEO_SIZE:
+            # Raising here would surface from the decoder as a generic read error.
+            self.exceeded = True
+            return 0
+        buf[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+def download_gcs_to_tempfile(blob, head: bytes, size: int) -> str:
+    """Write a GCS video of the given size to a local temp file.
+
+    The head already in memory is written first; the rest downloads as parallel
+    ranged slices, never past size, which has been checked against MAX_VIDEO_SIZE.
     """
-    # Create a temporary directory
-    temp_dir = tempfile.mkdtemp()
-    
-    def sanitize_filename(filename):
-        """Remove or replace problematic characters in filenames"""
-        # Remove or replace special characters, keep only alphanumeric, hyphens, underscores
-        sanitized = re.sub(r'[^\w\s-]', '', filename)  # Remove special chars except spaces, hyphens, underscores
-        sanitized = re.sub(r'\s+', '_', sanitized)     # Replace spaces with underscores
-        sanitized = re.sub(r'_+', '_', sanitized)      # Replace multiple underscores with single
-        sanitized = sanitized.strip('_')               # Remove leading/trailing underscores
-        return sanitized[:100]  # Limit length to 100 characters
-    
-    ydl_opts = {
-        'format': 'best[ext=mp4]/best',  # prefer mp4, fallback to best available
-        'outtmpl': os.path.join(temp_dir, 'tiktok_video.%(ext)s'),  # use simple filename first
-        'quiet': True,
-        'merge_output_format': 'mp4',    # merge fragments if needed
-        'noplaylist': True
-    }
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
+    with temp_file:
+        temp_file.write(head)
+        temp_file.truncate(size)  # so each slice can be written at its own offset
+
+    def download_slice(start):
+        with open(temp_file.name, "r+b") as f:
+            f.seek(start)
+            blob.download_to_file(f, start=start, end=min(start + GCS_SLICE_SIZE, size) - 1, checksum=None)
 
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-
-        if not info:
-            raise ValueError("Failed to download TikTok video: no info extracted.")
-        
-        # Get the actual downloaded file path
-        original_filename = ydl.prepare_filename(info)
-        if not os.path.exists(original_filename):
-            # Try with different extension if the original doesn't exist
-            base_name = os.path.splitext(original_filename)[0]
-            for ext in ['.mp4', '.webm', '.mkv']:
-                potential_file = base_name + ext
-                if os.path.exists(potential_file):
-                    original_filename = potential_file
-                    break
-        
-        if not os.path.exists(original_filename) or os.path.getsize(original_filename) == 0:
-            raise ValueError("Failed to download TikTok video: file not found or empty.")
-        
-        # Create sanitized filename
-        title = info.get('title', 'tiktok_video')
-        sanitized_title = sanitize_filename(title)
-        file_extension = os.path.splitext(original_filename)[1]
-        sanitized_filename = os.path.join(temp_dir, f"{sanitized_title}{file_extension}")
-        
-        # Rename the file to have a clean filename
-        os.rename(original_filename, sanitized_filename)
-        
-        return sanitized_filename
+        # Threads, not worker processes: we run inside gunicorn request threads.
+        with ThreadPoolExecutor(max_workers=GCS_DOWNLOAD_WORKERS) as pool:
+            list(pool.map(download_slice, range(len(head), size, GCS_SLICE_SIZE)))
+    except BaseException:
+        os.remove(temp_file.name)
+        raise
+    return temp_file.name
 
-    except Exception as e:
-        # Clean up temp directory on error
-        import shutil
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        raise ValueError(f"Failed to download TikTok video: {str(e)}")
 
-def process_video_local(video_path: str):
-    """Run OCR on a local video file."""
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise ValueError("OpenCV failed to open the video file.")
-
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    frame_num = 0
-    last_text = None
-    results = []
+def probe_video_size(video_path: str, head: bytes = None):
+    """Return the displayed (width, height) of the first video stream using ffprobe.
 
+    With video_path="pipe:0", the leading bytes in head are probed instead of a file.
+    """
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=width,height:stream_tags=rotate:stream_side_data=rotation",
+            "-of", "json", video_path,
+        ],
+        input=head,
+        capture_output=True,
+    )
+    streams = json.loads(result.stdout or "{}").get("streams") if result.returncode == 0 else None
+    if not streams or not streams[0].get("width") or not streams[0].get("height"):
+        raise ValueError("FFprobe failed to read the video stream.")
+
+    stream = streams[0]
+    width, height = stream["width"], stream["height"]
+    # ffmpeg auto-rotates on decode, so swap dimensions for portrait-tagged streams.
+    rotation = stream.get("tags", {}).get("rotate") or next(
+        (sd["rotation"] for sd in stream.get("side_data_list", []) if "rotation" in sd), 0
+    )
+    if int(rotation) % 180:
+        width, height = height, width
+    return width, height
+
+
+def frame_fingerprint(image):
+    """Small thumbnail of a greyscale image, used to spot near-identical frames."""
+    # Area-averaging a full 1080p band straight down is much slower than first point-sampling
+    # it to a 4x4 grid per thumbnail pixel, which still averages out noise and compression.
+    # At 1080p each thumbnail pixel covers about 8x9 source pixels, fine enough for a single
+    # changed caption glyph to exceed REPEAT_FRAME_MAX_DIFF while encoder noise stays under it.
+    sampled = cv2.resize(image, (FINGERPRINT_SIZE * 4, FINGERPRINT_SIZE * 4), interpolation=cv2.INTER_NEAREST)
+    return cv2.resize(sampled, (FINGERPRINT_SIZE, FINGERPRINT_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def is_repeat_frame(fingerprint, previous) -> bool:
+    return previous is not None and cv2.absdiff(fingerprint, previous).max() <= REPEAT_FRAME_MAX_DIFF
+
+
+def detect_hwaccel():
+    """Return the first ffmpeg hwaccel whose device initialises on this host, or None."""
     try:
+        listed = subprocess.run(["ffmpeg", "-hide_banner", "-hwaccels"], capture_output=True, text=True).stdout
+    except OSError:
+        return None
+    for name in HWACCEL_CANDIDATES:
+        if name not in listed.split():
+            continue
+        # Being compiled in says nothing about the hardware; actually open a device.
+        probe = subprocess.run(
+            ["ffmpeg", "-v", "error", "-init_hw_device", name, "-f", "lavfi", "-i", "nullsrc",
+             "-frames:v", "1", "-f", "null", "-"],
+            capture_output=True,
+        )
+        if probe.returncode == 0:
+            return name
+    return None
+
+
+# PyAV never uses a hardware decoder, so only probe for one when ffmpeg may be picked.
+HWACCEL = detect_hwaccel() if FRAME_BACKEND != "pyav" else None
+# In-process PyAV decoding skips the rawvideo pipe; ffmpeg is kept for hardware decoding.
+DECODER = FRAME_BACKEND or ("ffmpeg" if HWACCEL or av is None else "pyav")
+
+
+def _imencode(ext: str, image, params):
+    success, encoded = cv2.imencode(ext, image, params)
+    return encoded.tobytes() if success else None
+
+
+def encode_jpeg(image):
+    """JPEG-encode a greyscale image, preferring libturbojpeg's SIMD encoder; None on failure."""
+    if _turbojpeg is not None:
+        return _turbojpeg.encode(image, quality=JPEG_QUALITY, pixel_format=TJPF_GRAY, jpeg_subsample=TJSAMP_GRAY)
+    return _imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+
+
+def encode_image(image):
+    """Encode a greyscale image for Vision in IMAGE_FORMAT; None on failure."""
+    if IMAGE_FORMAT == "png":
+        return _imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, 3])
+    if IMAGE_FORMAT == "webp":
+        return _imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, WEBP_QUALITY])
+
+    jpeg = encode_jpeg(image)
+    if IMAGE_FORMAT == "auto" and jpeg is not None and len(jpeg) < PNG_TRY_MAX_BPP * image.size:
+        # Text over flat backgrounds compresses better losslessly, without ringing around the
+        # glyphs; on camera footage PNG is always the larger, so it is not worth encoding there.
+        png = _imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, 3])
+        if png is not None and len(png) < len(jpeg):
+            return png
+    return jpeg
+
+
+def is_pipe_decodable(head: bytes) -> bool:
+    """Check whether a video can be decoded from a non-seekable pipe given its leading bytes.
+
+    MP4/MOV files qualify only when the moov atom precedes mdat (fast start);
+    other containers are assumed to be streamable.
+    """
+    if head[4:8] != b"ftyp":
+        return True
+    pos = 0
+    while pos + 8 <= len(head):
+        size, kind = struct.unpack_from(">I4s", head, pos)
+        if kind == b"moov":
+            return True
+        if kind == b"mdat":
+            return False
+        if size == 1 and pos + 16 <= len(head):
+            size = struct.unpack_from(">Q", head, pos + 8)[0]
+        if size < 8:
+            return False
+        pos += size
+    return False
+
+
+def ocr_crop(width: int, height: int):
+    """Return the (y0, y1) rows of the band sent to Vision and the (w, h) it is resized to."""
+    y0 = int(height * TOP_IGNORE_RATIO)
+    y1 = int(height * (1 - BOTTOM_IGNORE_RATIO))
+    scale = min(1.0, MAX_OCR_DIMENSION / max(width, y1 - y0, 1))
+    return y0, y1, (round(width * scale), round((y1 - y0) * scale))
+
+
+# Frame sources decode a video into sampled 8-bit greyscale frames (the luma plane):
+# Vision reads text just as well from single-channel images, and the crop, resize and
+# encode all handle a third of the bytes. Each exposes frames(), a generator of
+# (frame_num, frame) run on one worker thread; to_ndarray(frame), which returns the
+# upright greyscale image, so frames that are never looked at are never converted;
+# abort(), which stops decoding from any thread; and close(). Frames stay valid after
+# later ones are pulled, and frames() raises ValueError if the video cannot be decoded.
+
+
+class FfmpegFrameSource:
+    """Sampled frames piped from an ffmpeg subprocess, hardware-decoded when HWACCEL is set.
+
+    When feed is given, it is called on a separate thread with ffmpeg's stdin to
+    stream the video in, and video_input should be "pipe:0".
+    """
+
+    def __init__(self, video_input: str, width: int, height: int, feed=None):
+        self.width, self.height = width, height
+        # ffmpeg drops non-sampled frames itself, so they are never converted or piped to us.
+        # With a hardware decoder, frames are downloaded to system memory before the filter chain;
+        # ffmpeg falls back to software decoding for codecs the device does not support.
+        hwaccel_args = ["-hwaccel", HWACCEL] if HWACCEL else []
+        self.process = subprocess.Popen(
+            [
+                "ffmpeg", "-v", "error", *hwaccel_args, "-i", video_input,
+                "-vf", f"select=not(mod(n\\,{FRAME_INTERVAL}))", "-fps_mode", "vfr",
+                "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1",
+            ],
+            stdin=subprocess.PIPE if feed else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._feed_error = None
+        self._feeder = None
+        if feed:
+            self._feeder = threading.Thread(target=self._feed_stdin, args=(feed,), daemon=True)
+            self._feeder.start()
+
+    def _feed_stdin(self, feed):
+        try:
+            with self.process.stdin:
+                feed(self.process.stdin)
+        except BrokenPipeError:
+            pass  # ffmpeg exited early; its return code reports why
+        except Exception as e:
+            self._feed_error = e
+
+    def frames(self):
+        frame_size = self.width * self.height
+        frame_num = 0
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            # A fresh buffer per frame, as the consumer may hold on to the last few.
+            frame = np.empty((self.height, self.width), np.uint8)
+            if self.process.stdout.readinto(frame) != frame_size:
                 break
-
-            if frame_num % FRAME_INTERVAL == 0:
-                success, encoded = cv2.imencode(".jpg", frame)
-                if not success:
+            yield frame_num, frame
+            frame_num += FRAME_INTERVAL
+
+        returncode = self.process.wait()
+        if self._feeder is not None:
+            self._feeder.join()
+            if self._feed_error is not None:
+                raise self._feed_error  # a truncated stream can still decode cleanly
+        if returncode != 0:
+            raise ValueError("FFmpeg failed to decode the video file.")
+
+    def to_ndarray(self, frame):
+        return frame  # ffmpeg already pipes greyscale, rotated frames
+
+    def abort(self):
+        self.process.kill()
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        if self._feeder is not None:
+            self._feeder.join()
+        self.process.stdout.close()
+        self.process.wait()
+
+
+class PyAVFrameSource:
+    """Sampled frames decoded in-process by PyAV, using frame threads on every core."""
+
+    def __init__(self, video_input):
+        try:
+            self.container = av.open(video_input)
+        except av.FFmpegError:
+            raise ValueError("Failed to read the video stream.") from None
+        if not self.container.streams.video:
+            self.container.close()
+            raise ValueError("Failed to read the video stream.")
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"
+        self._aborted = False
+
+    def frames(self):
+        try:
+            for frame_num, frame in enumerate(self.container.decode(self.stream)):
+                if self._aborted:
+                    return
+                if frame_num % FRAME_INTERVAL:
                     continue
-                image = vision.Image(content=encoded.tobytes())
-                response = vision_client.text_detection(image=image)
+                yield frame_num, frame
+        except av.FFmpegError:
+            raise ValueError("FFmpeg failed to decode the video file.") from None
+
+    def to_ndarray(self, frame):
+        # Only frames that are fingerprinted are converted out of the decoder's YUV planes.
+        image = frame.to_ndarray(format="gray")
+        if frame.rotation % 360:
+            # Match ffmpeg's auto-rotation of portrait-tagged streams.
+            image = np.ascontiguousarray(np.rot90(image, frame.rotation // 90))
+        return image
+
+    def abort(self):
+        self._aborted = True
+
+    def close(self):
+        self.container.close()
+
 
-                if response.full_text_annotation:
-                    text = clean_text(response, height)
-                    if text.strip() and text != last_text:
-                        results.append(text)
-                        last_text = text
+def open_frame_source(video_path: str):
+    """Open a local video file with the configured decoder."""
+    if DECODER == "pyav":
+        return PyAVFrameSource(video_path)
+    return FfmpegFrameSource(video_path, *probe_video_size(video_path))
 
-            frame_num += 1
+
+def process_video_local(video_path: str):
+    """Run OCR on a local video file, deleting it afterwards."""
+    try:
+        return run_async(ocr_video(open_frame_source(video_path)))
     finally:
-        cap.release()
         if os.path.exists(video_path):
             os.remove(video_path)
 
+
+def process_video_gcs(gcs_uri: str):
+    """Run OCR on a GCS video, decoding it while it streams in through ranged reads."""
+    blob = get_gcs_blob(gcs_uri)
+    # A single GET with no metadata request first fetches any video up to GCS_IN_MEMORY_MAX
+    # whole. The CRC32C pass is skipped: corruption would at worst garble a frame or fail
+    # the decode, and the later ranged reads cannot be checksummed anyway.
+    try:
+        head = blob.download_as_bytes(start=0, end=GCS_IN_MEMORY_MAX, checksum=None)
+    except RequestRangeNotSatisfiable:
+        raise ValueError("Video file is empty.") from None  # GCS rejects any range on a 0-byte object
+    whole = len(head) <= GCS_IN_MEMORY_MAX
+    if not whole:
+        check_gcs_blob_size(blob)  # only large videos pay for the metadata request
+
+    with blob.open("rb", chunk_size=GCS_READ_CHUNK) as blob_reader:
+        reader = CappedReader(blob_reader, head, size=len(head) if whole else None)
+        try:
+            if DECODER == "pyav":
+                # The reader is seekable, so PyAV can fetch a trailing moov atom itself.
+                return run_async(ocr_video(PyAVFrameSource(reader)))
+
+            probe_head = head[:GCS_READ_CHUNK]
+            if is_pipe_decodable(probe_head):
+                try:
+                    width, height = probe_video_size("pipe:0", probe_head)
+                except ValueError:
+                    pass  # header larger than the probe; fall back to a seekable file
+                else:
+                    def feed(stdin):
+                        shutil.copyfileobj(reader, stdin, GCS_READ_CHUNK)
+
+                    source = FfmpegFrameSource("pipe:0", width, height, feed=feed)
+                    return run_async(ocr_video(source))
+        finally:
+            if reader.exceeded:
+                raise ValueError("Video too large: exceeds the 512 MB limit")
+
+    size = len(head) if whole else blob.size
+    return process_video_local(download_gcs_to_tempfile(blob, head, size))
+
+
+def process_video_url(url: str):
+    """Run OCR on a video page URL (TikTok or anything else yt-dlp supports)."""
+    return process_video_local(download_tiktok_to_tempfile(url))
+
+
+# video_uri handlers by scheme; any other URI is handed to yt-dlp.
+VIDEO_SOURCES = {"gs": process_video_gcs}
+
+
+async def ocr_video(source):
+    """Decode sampled frames from a frame source, overlapping decoding with Vision RPCs.
+
+    Runs on the shared event loop, so all blocking and CPU-bound work happens on
+    executor threads. The source is closed when OCR finishes.
+    """
+    loop = asyncio.get_running_loop()
+    # One thread pulls frames from the source and crops/encodes them, never concurrently.
+    decode_io = ThreadPoolExecutor(max_workers=1)
+    queue = asyncio.Queue(maxsize=OCR_WORKERS)
+    results_queue = asyncio.Queue()
+    results = []
+
+    frames = source.frames()
+    crop = None  # set from the first frame's dimensions
+    last_fingerprint = None
+    last_ocr_num = -MIN_OCR_INTERVAL
+    window = []  # frames checked since the last OCR'd one, oldest first
+
+    def encode_latest_change(force):
+        """Encode the newest frame in window that differs from the last OCR'd one; None if none does.
+
+        With force, the newest frame is encoded even if it looks unchanged. Empties window.
+        """
+        nonlocal crop, last_fingerprint
+        newest = changed = None
+        # Newest first, so on moving footage only one frame per window is converted and fingerprinted.
+        for frame in reversed(window):
+            image = source.to_ndarray(frame)
+            if crop is None:
+                crop = ocr_crop(image.shape[1], image.shape[0])
+            # Only the band between the ignored top/bottom strips is sent to Vision.
+            roi = image[crop[0]:crop[1]]
+            fingerprint = frame_fingerprint(roi)
+            if newest is None:
+                newest = roi, fingerprint
+            # A near-identical frame would OCR to the same text, which is dropped anyway;
+            # check before resizing so repeats cost only the thumbnail.
+            if not is_repeat_frame(fingerprint, last_fingerprint):
+                changed = roi, fingerprint
+                break
+        window.clear()
+        if changed is None and not force:
+            return None
+
+        roi, fingerprint = changed or newest
+        ocr_size = crop[2]
+        if ocr_size != (roi.shape[1], roi.shape[0]):
+            roi = cv2.resize(roi, ocr_size, interpolation=cv2.INTER_AREA)
+        if ADAPTIVE_THRESHOLD:
+            roi = cv2.adaptiveThreshold(roi, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 31, 10)
+        content = encode_image(roi)
+        if content is not None:
+            last_fingerprint = fingerprint
+        return content
+
+    def next_sample():
+        """Encode the next frame to OCR; None at end of stream.
+
+        Frames are checked every FRAME_INTERVAL frames but sent at most once per
+        MIN_OCR_INTERVAL: when that spacing runs out, the newest checked frame that
+        changed is sent, so a caption shown in between is still read. Static stretches
+        cost one RPC per MAX_OCR_INTERVAL, in case a change was too small to notice.
+        """
+        nonlocal last_ocr_num
+        for frame_num, frame in frames:
+            window.append(frame)
+            since_ocr = frame_num - last_ocr_num
+            if since_ocr < MIN_OCR_INTERVAL:
+                continue
+            content = encode_latest_change(force=since_ocr >= MAX_OCR_INTERVAL)
+            if content is not None:
+                # Spaced by when frames are sent rather than which, so the rate ceiling holds.
+                last_ocr_num = frame_num
+                return content
+        # A change still waiting out MIN_OCR_INTERVAL when the video ends.
+        return encode_latest_change(force=False) if window else None
+
+    def close_source():
+        decode_io.shutdown(wait=True)
+        source.close()
+
+    async def produce():
+        seq = 0
+        batch = []
+        while True:
+            content = await loop.run_in_executor(decode_io, next_sample)
+            if content is None:
+                break
+            batch.append(content)
+            if len(batch) == VISION_BATCH_SIZE:
+                await queue.put((seq, batch))
+                seq += 1
+                batch = []
+
+        if batch:
+            await queue.put((seq, batch))
+        for _ in range(OCR_WORKERS):
+            await queue.put(None)
+
+    async def ocr_worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                await results_queue.put(None)
+                return
+            seq, batch = item
+            requests = [
+                vision.AnnotateImageRequest(image=vision.Image(content=content), features=[TEXT_DETECTION])
+                for content in batch
+            ]
+            async with _vision_in_flight:
+                response = await vision_client.batch_annotate_images(requests=requests)
+            await results_queue.put((seq, response.responses))
+
+    cleaned = OrderedDict()
+    last_key = None
+    last_text_hash = None
+
+    def clean_batch(responses):
+        """Clean one batch of responses in frame order, appending new texts to results.
+
+        Static scenes return identical annotations: an exact repeat of the previous
+        frame's raw text is skipped outright, and older repeats reuse their cached
+        cleaned text instead of walking the pages/blocks/paragraphs again.
+        """
+        nonlocal last_key, last_text_hash
+        for response in responses:
+            if not response.full_text_annotation:
+                continue
+            key = hash(response.full_text_annotation.text)
+            if key == last_key:
+                continue
+            last_key = key
+
+            text = cleaned.get(key)
+            if text is None:
+                text = clean_text(response)
+                cleaned[key] = text
+                if len(cleaned) > CLEAN_TEXT_CACHE_SIZE:
+                    cleaned.popitem(last=False)
+            else:
+                cleaned.move_to_end(key)
+
+            # str caches its hash, so texts served from the cache are not rehashed.
+            text_hash = hash(text)
+            if text_hash != last_text_hash and text.strip():
+                results.append(text)
+                last_text_hash = text_hash
+
+    async def collect():
+        """Clean responses in frame order as their batches complete.
+
+        Batches can finish out of order, so they wait in pending until every earlier
+        batch has been cleaned; this keeps consecutive-duplicate suppression correct.
+        Cleaning is CPU work, so it runs off the shared loop, one batch at a time.
+        """
+        pending = {}
+        next_seq = 0
+        workers_left = OCR_WORKERS
+        while workers_left:
+            item = await results_queue.get()
+            if item is None:
+                workers_left -= 1
+                continue
+            seq, responses = item
+            pending[seq] = responses
+
+            while next_seq in pending:
+                await loop.run_in_executor(None, clean_batch, pending.pop(next_seq))
+                next_seq += 1
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(produce())
+            for _ in range(OCR_WORKERS):
+                tg.create_task(ocr_worker())
+            tg.create_task(collect())
+    except BaseExceptionGroup as group:
+        source.abort()
+        raise group.exceptions[0] from None
+    except BaseException:
+        source.abort()
+        raise
+    finally:
+        # Waiting for the decode thread and closing the source can block on a pending
+        # GCS read, which must not stall every other request's RPCs on the shared loop.
+        await loop.run_in_executor(None, close_source)
+
     return results
 
 
@@ -189,12 +795,8 @@ def run_video_ocr():
         return jsonify({"error": "Missing video_uri"}), 400
 
     try:
-        if source.startswith("gs://"):
-            video_path = download_gcs_to_tempfile(source)
-        else:
-            video_path = download_tiktok_to_tempfile(source)
-
-        results = process_video_local(video_path)
+        scheme = source.split("://", 1)[0] if "://" in source else ""
+        results = VIDEO_SOURCES.get(scheme, process_video_url)(source)
         return jsonify(results)
 
     except ValueError as ve:
@@ -0,0 +1,15 @@
+import os
+import sys
+from unittest import mock
+
+import google.auth
+from google.auth.credentials import AnonymousCredentials
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+# Keep importing main offline: no startup Vision request, no ffmpeg hardware probe, and
+# anonymous credentials for the Vision client it builds.
+os.environ["VISION_PREWARM"] = "0"
+os.environ["FRAME_BACKEND"] = "pyav"
+with mock.patch.object(google.auth, "default", return_value=(AnonymousCredentials(), None)):
+    import main  # noqa: E402,F401
@@ -0,0 +1,155 @@
+import io
+import json
+import struct
+import subprocess
+
+import pytest
+
+import main
+from main import CappedReader, is_pipe_decodable, probe_video_size
+
+DATA = bytes(range(256)) * 4  # 1 KiB object
+
+
+class FakeBlobReader(io.BytesIO):
+    """In-memory stand-in for a GCS BlobReader that records the seeks and reads it serves."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.calls = []
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.calls.append(("seek", offset, whence))
+        return super().seek(offset, whence)
+
+    def read(self, size=-1):
+        self.calls.append(("read", size))
+        return super().read(size)
+
+
+def test_whole_object_in_head_never_touches_blob():
+    blob_reader = FakeBlobReader(DATA)
+    reader = CappedReader(blob_reader, DATA, size=len(DATA))
+    assert reader.read() == DATA
+    assert reader.seek(-10, io.SEEK_END) == len(DATA) - 10
+    assert reader.read() == DATA[-10:]
+    assert blob_reader.calls == []
+
+
+def test_reads_switch_from_head_to_blob():
+    blob_reader = FakeBlobReader(DATA)
+    reader = CappedReader(blob_reader, DATA[:100])
+    assert reader.read(60) == DATA[:60]
+    assert reader.read(60) == DATA[60:100]  # a read stops at the end of head
+    assert reader.read(60) == DATA[100:160]
+    # The blob reader starts at 0, so the first read past head has to seek it.
+    assert blob_reader.calls == [("seek", 100, io.SEEK_SET), ("read", 60)]
+    assert reader.read(40) == DATA[160:200]
+    assert blob_reader.calls[-1] == ("read", 40)  # sequential reads need no seek
+
+
+def test_seek_end_with_unknown_size_asks_blob_reader():
+    blob_reader = FakeBlobReader(DATA)
+    reader = CappedReader(blob_reader, DATA[:100])
+    assert reader.seek(-24, io.SEEK_END) == len(DATA) - 24
+    assert blob_reader.calls == [("seek", 0, io.SEEK_END)]
+    assert reader.read() == DATA[-24:]
+    assert reader.read(10) == b""
+
+
+def test_seek_back_into_head_after_blob_reads():
+    blob_reader = FakeBlobReader(DATA)
+    reader = CappedReader(blob_reader, DATA[:100])
+    reader.seek(500)
+    assert reader.read(10) == DATA[500:510]
+    reader.seek(20)
+    calls = len(blob_reader.calls)
+    assert reader.read(10) == DATA[20:30]
+    assert len(blob_reader.calls) == calls
+    reader.seek(510)
+    assert reader.read(10) == DATA[510:520]
+    assert len(blob_reader.calls) == calls + 1  # still positioned at 510
+
+
+def test_reading_past_cap_ends_stream_and_flags_exceeded(monkeypatch):
+    monkeypatch.setattr(main, "MAX_VIDEO_SIZE", 300)
+    reader = CappedReader(FakeBlobReader(DATA), DATA[:100])
+    assert reader.read(200) == DATA[:100]
+    assert reader.read(200) == DATA[100:300]
+    assert not reader.exceeded
+    assert reader.read(1) == b""
+    assert reader.exceeded
+
+
+def box(kind, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+FTYP = box(b"ftyp", b"isom\x00\x00\x02\x00")
+
+
+def test_pipe_decodable_non_mp4():
+    assert is_pipe_decodable(b"\x1a\x45\xdf\xa3" + bytes(60))  # Matroska/WebM
+
+
+def test_pipe_decodable_moov_before_mdat():
+    assert is_pipe_decodable(FTYP + box(b"free", bytes(8)) + box(b"moov", bytes(16)) + box(b"mdat"))
+
+
+def test_pipe_decodable_mdat_before_moov():
+    assert not is_pipe_decodable(FTYP + box(b"mdat", bytes(32)) + box(b"moov"))
+
+
+def test_pipe_decodable_64_bit_box_size():
+    large_free = struct.pack(">I4sQ", 1, b"free", 16 + 8) + bytes(8)
+    assert is_pipe_decodable(FTYP + large_free + box(b"moov"))
+    large_mdat = struct.pack(">I4sQ", 1, b"mdat", 1 << 33)
+    assert not is_pipe_decodable(FTYP + large_mdat)
+
+
+def test_pipe_decodable_head_ends_before_moov():
+    assert not is_pipe_decodable(FTYP + struct.pack(">I4s", 1 << 20, b"free") + bytes(100))
+
+
+def test_pipe_decodable_invalid_box_size():
+    assert not is_pipe_decodable(FTYP + struct.pack(">I4s", 4, b"free") + box(b"moov"))
+
+
+def fake_ffprobe(monkeypatch, stream=None, returncode=0):
+    def run(args, **kwargs):
+        stdout = json.dumps({"streams": [stream] if stream else []}).encode()
+        return subprocess.CompletedProcess(args, returncode, stdout=stdout, stderr=b"")
+    monkeypatch.setattr(main.subprocess, "run", run)
+
+
+def test_probe_plain_stream(monkeypatch):
+    fake_ffprobe(monkeypatch, {"width": 1920, "height": 1080})
+    assert probe_video_size("video.mp4") == (1920, 1080)
+
+
+def test_probe_rotate_tag_swaps(monkeypatch):
+    fake_ffprobe(monkeypatch, {"width": 1920, "height": 1080, "tags": {"rotate": "90"}})
+    assert probe_video_size("video.mp4") == (1080, 1920)
+
+
+def test_probe_side_data_rotation_swaps(monkeypatch):
+    stream = {"width": 1920, "height": 1080, "side_data_list": [{"side_data_type": "Display Matrix", "rotation": -90}]}
+    fake_ffprobe(monkeypatch, stream)
+    assert probe_video_size("pipe:0", b"head") == (1080, 1920)
+
+
+def test_probe_upside_down_does_not_swap(monkeypatch):
+    fake_ffprobe(monkeypatch, {"width": 1920, "height": 1080, "tags": {"rotate": "180"}})
+    assert probe_video_size("video.mp4") == (1920, 1080)
+
+
+def test_probe_failure_raises(monkeypatch):
+    fake_ffprobe(monkeypatch, returncode=1)
+    with pytest.raises(ValueError):
+        probe_video_size("video.mp4")
+
+
+def test_probe_missing_dimensions_raises(monkeypatch):
+    fake_ffprobe(monkeypatch, {"height": 1080})
+    with pytest.raises(ValueError):
+        probe_video_size("video.mp4")
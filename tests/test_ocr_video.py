@@ -0,0 +1,207 @@
+import asyncio
+import io
+
+import cv2
+import numpy as np
+import pytest
+from google.cloud import vision
+
+import main
+
+WIDTH, HEIGHT = 1080, 1920
+_rng = np.random.default_rng(0)
+BACKGROUND = cv2.normalize(
+    cv2.GaussianBlur(_rng.integers(0, 256, (HEIGHT, WIDTH), np.uint8), (0, 0), 25), None, 40, 200, cv2.NORM_MINMAX
+)
+
+
+def caption_frame(text, scale=2.2):
+    """A portrait frame with text drawn as an outlined caption over a static background."""
+    frame = BACKGROUND.copy()
+    for thickness, colour in ((round(3.6 * scale), 0), (round(1.4 * scale), 255)):
+        cv2.putText(frame, text, (120, 900), cv2.FONT_HERSHEY_SIMPLEX, scale, colour, thickness, cv2.LINE_AA)
+    return frame
+
+
+def band_fingerprint(frame):
+    y0, y1, _ = main.ocr_crop(WIDTH, HEIGHT)
+    return main.frame_fingerprint(frame[y0:y1])
+
+
+@pytest.mark.parametrize("scale", [1.4, 2.2])
+@pytest.mark.parametrize("before, after", [("Part 1", "Part 2"), ("Day 1 of 30", "Day 2 of 30"), ("I was 19", "I was 18")])
+def test_one_character_caption_edit_is_not_a_repeat(before, after, scale):
+    previous = band_fingerprint(caption_frame(before, scale))
+    assert not main.is_repeat_frame(band_fingerprint(caption_frame(after, scale)), previous)
+
+
+def test_same_caption_after_h264_round_trip_is_a_repeat():
+    av = pytest.importorskip("av")
+    rng = np.random.default_rng(1)
+    frame = caption_frame("Part 1").astype(np.int16)
+    encoded = io.BytesIO()
+    with av.open(encoded, "w", format="mp4") as container:
+        stream = container.add_stream("libx264", rate=30, options={"crf": "32"})
+        stream.width, stream.height, stream.pix_fmt = WIDTH, HEIGHT, "yuv420p"
+        for _ in range(main.FRAME_INTERVAL + 1):
+            grainy = np.clip(frame + rng.integers(-8, 9, frame.shape), 0, 255).astype(np.uint8)
+            container.mux(stream.encode(av.VideoFrame.from_ndarray(grainy, format="gray")))
+        container.mux(stream.encode())
+    encoded.seek(0)
+    with av.open(encoded) as container:
+        decoded = [f.to_ndarray(format="gray") for f in container.decode(video=0)]
+    assert main.is_repeat_frame(band_fingerprint(decoded[-1]), band_fingerprint(decoded[0]))
+
+
+def annotation(text):
+    """A Vision response with one paragraph per line of text."""
+    if not text:
+        return vision.AnnotateImageResponse()
+    paragraphs = [
+        vision.Paragraph(words=[vision.Word(symbols=[vision.Symbol(text=c) for c in word]) for word in line.split()])
+        for line in text.split("\n")
+    ]
+    return vision.AnnotateImageResponse(
+        full_text_annotation=vision.TextAnnotation(text=text, pages=[vision.Page(blocks=[vision.Block(paragraphs=paragraphs)])])
+    )
+
+
+class StubSource:
+    """Frame source over in-memory images, one every step frames."""
+
+    def __init__(self, images, step=None):
+        self.images = images
+        self.step = step or main.FRAME_INTERVAL
+        self.closed = False
+
+    def frames(self):
+        for i, image in enumerate(self.images):
+            yield i * self.step, image
+
+    def to_ndarray(self, frame):
+        return frame
+
+    def abort(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeVision:
+    """Async Vision client that reads each image with read(image) and answers after delay(texts) seconds."""
+
+    def __init__(self, read, delay=None):
+        self.read = read
+        self.delay = delay
+        self.texts = []  # texts read, in request order
+        self.finished = []  # texts of each batch, in completion order
+
+    async def batch_annotate_images(self, requests):
+        texts = []
+        for request in requests:
+            image = cv2.imdecode(np.frombuffer(request.image.content, np.uint8), cv2.IMREAD_GRAYSCALE)
+            texts.append(self.read(image))
+        self.texts += texts
+        if self.delay:
+            await asyncio.sleep(self.delay(texts))
+        self.finished.append(texts)
+        return vision.BatchAnnotateImagesResponse(responses=[annotation(text) for text in texts])
+
+
+def caption_reader(captions):
+    """Read an image as the caption whose frame it is closest to."""
+    y0, y1, size = main.ocr_crop(WIDTH, HEIGHT)
+    bands = {text: cv2.resize(caption_frame(text)[y0:y1], size, interpolation=cv2.INTER_AREA) for text in captions}
+    return lambda image: min(bands, key=lambda text: cv2.absdiff(bands[text], image).mean())
+
+
+def run_captions(monkeypatch, timeline):
+    """OCR a clip given as (caption, frame count) spans; returns the results and the fake client."""
+    fake = FakeVision(caption_reader({text for text, _ in timeline}))
+    frames = {text: caption_frame(text) for text, _ in timeline}
+    images = [frames[text] for text, count in timeline for _ in range(count // main.FRAME_INTERVAL)]
+    monkeypatch.setattr(main, "vision_client", fake)
+    source = StubSource(images)
+    results = main.run_async(main.ocr_video(source))
+    assert source.closed
+    return results, fake
+
+
+def test_small_caption_change_is_read(monkeypatch):
+    results, _ = run_captions(monkeypatch, [("Part 1", 90), ("Part 2", 90)])
+    assert results == ["Part 1", "Part 2"]
+
+
+def test_change_during_min_interval_is_sent_at_next_slot(monkeypatch):
+    # A is OCR'd at frame 40 and the blank after it at 70; B is on screen at the checks
+    # at 80 and 90, but gone by 100, the first frame that may be sent after 70.
+    timeline = [("", 40), ("A", 20), ("", 20), ("B", 20), ("", 60)]
+    results, fake = run_captions(monkeypatch, timeline)
+    assert results == ["A", "B"]
+    assert fake.texts == ["", "A", "", "B", ""]
+
+
+def test_static_video_is_resampled_every_max_interval(monkeypatch):
+    results, fake = run_captions(monkeypatch, [("Same caption", 200)])
+    assert results == ["Same caption"]
+    assert len(fake.texts) == len(range(0, 200, main.MAX_OCR_INTERVAL))
+
+
+def test_moving_footage_is_sent_at_most_once_per_min_interval(monkeypatch):
+    fake = FakeVision(lambda image: "")
+    images = [np.full((HEIGHT, WIDTH), 20 * i, np.uint8) for i in range(13)]  # every frame differs
+    monkeypatch.setattr(main, "vision_client", fake)
+    main.run_async(main.ocr_video(StubSource(images)))
+    assert len(fake.texts) == len(range(0, 13 * main.FRAME_INTERVAL, main.MIN_OCR_INTERVAL))
+
+
+def test_change_pending_at_end_of_video_is_sent(monkeypatch):
+    results, fake = run_captions(monkeypatch, [("", 10), ("A", 10)])
+    assert results == ["A"]
+    assert fake.texts == ["", "A"]
+
+
+def run_texts(monkeypatch, texts, delay=None):
+    """OCR one flat frame per text, each sent in its own batch; returns the results and the fake client."""
+    monkeypatch.setattr(main, "VISION_BATCH_SIZE", 1)
+    # Each frame is a distinct flat grey level that reads back as its text.
+    levels = {25 * (i + 1): text for i, text in enumerate(texts)}
+    fake = FakeVision(lambda image: levels[int(round(image.mean()))], delay)
+    monkeypatch.setattr(main, "vision_client", fake)
+    images = [np.full((HEIGHT, WIDTH), level, np.uint8) for level in levels]
+    results = main.run_async(main.ocr_video(StubSource(images, step=main.MIN_OCR_INTERVAL)))
+    return results, fake
+
+
+def test_batches_finishing_out_of_order_are_cleaned_in_frame_order(monkeypatch):
+    texts = [f"line {i}" for i in range(6)]
+    # Earlier batches take longer, so they complete after later ones.
+    results, fake = run_texts(monkeypatch, texts, delay=lambda batch: 0.05 * (6 - int(batch[0].split()[1])))
+    assert [batch[0] for batch in fake.finished] != texts
+    assert results == texts
+
+
+def test_consecutive_repeats_are_dropped(monkeypatch):
+    # Identical raw text is skipped outright; "B\ntiktok" differs raw but cleans to "B".
+    # Frames with no text, or only unwanted text, add nothing; an earlier, non-adjacent
+    # text is kept again.
+    texts = ["A", "A", "B", "B\ntiktok", "", "tiktok", "A", "B"]
+    results, _ = run_texts(monkeypatch, texts)
+    assert results == ["A", "B", "A", "B"]
+
+
+def test_clean_text_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(main, "CLEAN_TEXT_CACHE_SIZE", 2)
+    cleaned = []
+    clean_text = main.clean_text
+
+    def counting_clean_text(response):
+        cleaned.append(response.full_text_annotation.text)
+        return clean_text(response)
+
+    monkeypatch.setattr(main, "clean_text", counting_clean_text)
+    results, _ = run_texts(monkeypatch, ["A", "B", "A", "C", "A", "B"])
+    assert results == ["A", "B", "A", "C", "A", "B"]
+    # The second A is a cache hit and moves A to the front, so C evicts B, not A.
+    assert cleaned == ["A", "B", "C", "B"]